@@ -0,0 +1,17 @@
+import os
+from pathlib import Path
+
+from diskcache import Cache
+
+# Root for all persistent caches; override with AGENT_TEST_CACHE_DIR
+CACHE_DIR = Path(os.getenv("AGENT_TEST_CACHE_DIR", Path.home() / ".cache" / "agent_test"))
+
+
+def get_cache(name: str) -> Cache:
+    """
+    Open a persistent on-disk cache.
+
+    :param name: name of the cache, used as a subdirectory of CACHE_DIR
+    :return: diskcache Cache
+    """
+    return Cache(str(CACHE_DIR / name))
@@ -0,0 +1,66 @@
+import asyncio
+import functools
+import os
+import weakref
+from contextlib import asynccontextmanager
+from typing import Callable, TypeVar
+
+from pydantic_ai.models.openai import OpenAIModel
+
+T = TypeVar("T")
+
+# Maximum number of LLM requests in flight at once, across all agents
+MAX_CONCURRENCY = int(os.getenv("AGENT_TEST_MAX_CONCURRENCY", "16"))
+
+
+def loop_local(factory: Callable[[], T]) -> Callable[[], T]:
+    """
+    Wrap a factory so it is called once per running event loop.
+
+    asyncio primitives and pooled HTTP connections are bound to the loop that
+    first uses them, so sharing one instance across separate ``asyncio.run``
+    calls breaks; this keeps one instance per loop instead.
+
+    :param factory: zero-argument function creating the object
+    :return: accessor returning the object for the running event loop
+    """
+    instances: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, T]" = weakref.WeakKeyDictionary()
+
+    @functools.wraps(factory)
+    def get() -> T:
+        loop = asyncio.get_running_loop()
+        instance = instances.get(loop)
+        if instance is None:
+            instance = instances[loop] = factory()
+        return instance
+
+    return get
+
+
+@loop_local
+def llm_semaphore() -> asyncio.Semaphore:
+    """
+    Get the semaphore bounding concurrent LLM requests on the running event loop.
+
+    :return: shared semaphore with MAX_CONCURRENCY slots
+    """
+    return asyncio.Semaphore(MAX_CONCURRENCY)
+
+
+class BoundedOpenAIModel(OpenAIModel):
+    """
+    OpenAIModel that holds a slot of llm_semaphore() for every request.
+
+    Bounding individual model requests, rather than whole agent runs, means tools
+    that call other agents (e.g. map interpretation) cannot deadlock waiting for a slot.
+    """
+
+    async def request(self, *args, **kwargs):
+        async with llm_semaphore():
+            return await super().request(*args, **kwargs)
+
+    @asynccontextmanager
+    async def request_stream(self, *args, **kwargs):
+        async with llm_semaphore():
+            async with super().request_stream(*args, **kwargs) as response:
+                yield response
@@ -1,3 +1,4 @@
 from nmdc_geoloc_tools import elevation
 
-print(elevation((35.97583846, 82.2743123)))
\ No newline at end of file
+if __name__ == "__main__":
+    print(elevation((35.97583846, 82.2743123)))
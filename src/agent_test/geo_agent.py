@@ -1,16 +1,24 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
 import os
+import sys
 from datetime import datetime
 from typing import List
 
 from nmdc_geoloc_tools import elevation
 from pydantic_ai import Agent, ModelRetry, BinaryContent
-from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
 
-from agent_test.maptools import get_static_map
+from agent_test import maptools
+from agent_test.cache import get_cache
+from agent_test.concurrency import BoundedOpenAIModel
+from agent_test.maptools import downscale_map, get_static_map
 
 api_key = os.getenv("CBORG_API_KEY")
-ai_model = OpenAIModel(
+ai_model = BoundedOpenAIModel(
     "openai/gpt-4o",
     provider=OpenAIProvider(
         base_url="https://api.cborg.lbl.gov",
@@ -18,17 +26,25 @@ ai_model = OpenAIModel(
 )
 
 
-geo_agent = Agent(
-    ai_model,
-    system_prompt="""You are an awesome geography teacher.
+GEO_SYSTEM_PROMPT = """You are an awesome geography teacher.
     You can use the following tools to help you answer questions:
     
     `get_elev`: Get the elevation of a location.
     `fetch_map_image_and_interpret`: Fetch an image of a location and describe it.
+    `fetch_map_images_and_interpret`: Fetch and describe images of a location at several
+      zoom levels and map types at once.
     
     Note that when interpreting images, you might want to try different zoom levels
     and switching between roadmap and satellite to get an overall sense of what is there.
+    Prefer `fetch_map_images_and_interpret` for this, as it fetches all the views in parallel.
+
+    When you need more than one tool, call all the relevant tools in a single response
+    so they run in parallel.
     """
+
+geo_agent = Agent(
+    ai_model,
+    system_prompt=GEO_SYSTEM_PROMPT,
 )
 
 from meteostat import Point, Hourly
@@ -57,8 +73,19 @@ def get_current_temperature(
     print(f"Temperature: {t}")
     return t
 
+_elev_cache = get_cache("elevation")
+
+@functools.lru_cache(maxsize=4096)
+def _cached_elevation(lat: float, lon: float) -> float:
+    key = (lat, lon)
+    if key in _elev_cache:
+        return _elev_cache[key]
+    elev = elevation(key)
+    _elev_cache[key] = elev
+    return elev
+
 @geo_agent.tool_plain
-def get_elev(
+async def get_elev(
     lat: float, lon: float,
 ) -> float:
     """
@@ -69,13 +96,22 @@ def get_elev(
     :return: elevation in m
     """
     print(f"Looking up elevation for lat={lat}, lon={lon}")
-    return elevation((lat, lon))
+    # round so that near-identical coordinates share a cache entry
+    return await asyncio.to_thread(_cached_elevation, round(lat, 5), round(lon, 5))
 
 map_reader_agent = Agent(
     ai_model,
     system_prompt='Your job is to interpret images of maps.',
 )
 
+def _map_prompt(maptype: str) -> str:
+    return f"""list all of the features you see in this {maptype} image.
+            Only give me actual features, I don't care that I am looking at a google map.
+            In particular, environmental features, or kinds of buildings. Give your best guess,
+            but tell me if you are not sure. If it's zoomed in too far or out too far, say this
+            in your response.
+            """
+
 @geo_agent.tool_plain
 async def fetch_map_image_and_interpret(lat: float, lon: float, zoom=18, maptype="satellite") -> List[str]:
     """
@@ -93,23 +129,129 @@ async def fetch_map_image_and_interpret(lat: float, lon: float, zoom=18, maptype
         list: list of descriptions
     """
     print(f"Fetching map image for lat={lat}, lon={lon}")
-    img_bytes = get_static_map(lat, lon, zoom=zoom, maptype=maptype)
-    img = BinaryContent(data=img_bytes, media_type='image/png')
-    if not img:
+    img_bytes = await get_static_map(lat, lon, zoom=zoom, maptype=maptype)
+    if not img_bytes:
         raise ModelRetry("Could not find image for structure")
+    img = BinaryContent(data=downscale_map(img_bytes), media_type='image/jpeg')
 
-    r = await map_reader_agent.run(
-        [f"""list all of the features you see in this {maptype} image.
-            Only give me actual features, I don't care that I am looking at a google map.
-            In particular, environmental features, or kinds of buildings. Give your best guess,
-            but tell me if you are not sure. If it's zoomed in too far or out too far, say this
-            in your response.
-            """, img],
-        )
+    r = await map_reader_agent.run([_map_prompt(maptype), img])
     print("INTERPRETATION", r.data)
     return r.data
 
-result = geo_agent.run_sync('What is the temperature at 35.97583846 and long=-84.2743123')
-#result = geo_agent.run_sync('What features do you see at 35.97583846 and long=-84.2743123')
-#result = geo_agent.run_sync('How high is the location on earth with lat=35.97583846 and long=-84.2743123')
-#print(result.all_messages_json())  # type: ignore
+@geo_agent.tool_plain
+async def fetch_map_images_and_interpret(
+    lat: float, lon: float,
+    zooms: List[int] = (13, 16, 18),
+    maptypes: List[str] = ("satellite",),
+) -> List[dict]:
+    """
+    Fetch images of a location at several zoom levels and map types, and describe each one.
+
+    All combinations of zoom and map type are fetched and interpreted in parallel, so prefer
+    this over calling `fetch_map_image_and_interpret` repeatedly.
+
+    Args:
+        lat: Latitude of the location
+        lon: Longitude of the location
+        zooms: Zoom levels for the map (18 is good for zoomed in, 13 for further out)
+        maptypes: Types of map (e.g., "satellite", "roadmap")
+
+    Returns:
+        list: one description per zoom level and map type
+    """
+    print(f"Fetching map images for lat={lat}, lon={lon}, zooms={zooms}, maptypes={maptypes}")
+    combos = [(z, m) for z in zooms for m in maptypes]
+    imgs = await asyncio.gather(*[get_static_map(lat, lon, zoom=z, maptype=m) for z, m in combos])
+    found = [(combo, img_bytes) for combo, img_bytes in zip(combos, imgs) if img_bytes]
+    if not found:
+        raise ModelRetry("Could not find any images for structure")
+
+    rs = await asyncio.gather(*[
+        map_reader_agent.run([_map_prompt(m), BinaryContent(data=downscale_map(img_bytes), media_type='image/jpeg')])
+        for (z, m), img_bytes in found
+    ])
+    descs = {combo: r.data for (combo, _), r in zip(found, rs)}
+    return [
+        {"zoom": z, "maptype": m, "desc": descs.get((z, m), "Could not fetch image")}
+        for z, m in combos
+    ]
+
+_resp_cache = get_cache("agent_responses")
+RESP_CACHE_EXPIRE = 7 * 86400
+
+@functools.lru_cache(maxsize=1)
+def _tools_fingerprint() -> str:
+    """
+    Hash the registered tools (names, descriptions, JSON schemas) and the code behind them.
+
+    Any change to a tool, or to this module or maptools, invalidates stored responses.
+    """
+    h = hashlib.sha1()
+    for name, tool in sorted(geo_agent._function_tools.items()):
+        h.update(name.encode())
+        h.update((tool.description or "").encode())
+        h.update(json.dumps(tool._parameters_json_schema, sort_keys=True).encode())
+    for module in (sys.modules[__name__], maptools):
+        h.update(inspect.getsource(module).encode())
+    return h.hexdigest()
+
+def _response_key(prompt: str) -> str:
+    return hashlib.sha1(
+        f"{ai_model.model_name}\n{GEO_SYSTEM_PROMPT}\n{_tools_fingerprint()}\n{prompt}".encode()
+    ).hexdigest()
+
+async def run_cached(prompt: str) -> str:
+    """
+    Run geo_agent on a prompt, reusing a stored response for the same prompt if there is one.
+
+    Responses are keyed on the model, system prompt, tools and user prompt, and are only
+    stored by calling store_response once they have been checked. Set AGENT_TEST_USE_CACHE=0
+    to always query the model; with CBORG_OFFLINE=1 only stored responses are used.
+
+    :param prompt: user prompt
+    :return: response data
+    """
+    offline = os.getenv("CBORG_OFFLINE") == "1"
+    use_cache = offline or os.getenv("AGENT_TEST_USE_CACHE", "1") == "1"
+    if use_cache:
+        data = _resp_cache.get(_response_key(prompt))
+        if data is not None:
+            return data
+    if offline:
+        raise RuntimeError(f"No cached response for {prompt!r} and CBORG_OFFLINE=1")
+    r = await geo_agent.run(prompt)
+    return r.data
+
+def store_response(prompt: str, data: str) -> None:
+    """
+    Store a checked response for run_cached; it expires after RESP_CACHE_EXPIRE seconds.
+
+    Only store responses to prompts with a stable answer (e.g. elevation, map features),
+    never ones that depend on live data such as the current temperature.
+
+    Empty responses are ignored, and an existing entry is left in place, so serving
+    a response from the cache does not extend its expiry.
+
+    :param prompt: user prompt
+    :param data: response data that has passed its checks
+    """
+    if not data:
+        return
+    _resp_cache.add(_response_key(prompt), data, expire=RESP_CACHE_EXPIRE)
+
+DEMO_QUERIES = [
+    'What is the temperature at 35.97583846 and long=-84.2743123',
+    #'What features do you see at 35.97583846 and long=-84.2743123',
+    #'How high is the location on earth with lat=35.97583846 and long=-84.2743123',
+]
+
+
+async def main():
+    results = await asyncio.gather(*[geo_agent.run(q) for q in DEMO_QUERIES])
+    #for result in results:
+    #    print(result.all_messages_json())  # type: ignore
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,8 +1,19 @@
+import asyncio
+import os
+
 from pydantic_ai import Agent
-from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
 
-ai_model = OpenAIModel(
+from agent_test.concurrency import BoundedOpenAIModel
+
+# Load CBORG API key from environment variable
+api_key = os.getenv("CBORG_API_KEY")
+
+# Ensure the API key is set
+if not api_key:
+    raise ValueError("CBORG_API_KEY environment variable is not set.")
+
+ai_model = BoundedOpenAIModel(
     "openai/gpt-4o",
     provider=OpenAIProvider(
         base_url="https://api.cborg.lbl.gov",
@@ -15,8 +26,20 @@ agent = Agent(
     system_prompt='Be concise, reply with one sentence.',
 )
 
-result = agent.run_sync('Where does "hello world" come from?')
-print(result.data)
+DEMO_QUERIES = [
+    'Where does "hello world" come from?',
+]
+
+
+async def main():
+    results = await asyncio.gather(*[agent.run(q) for q in DEMO_QUERIES])
+    for result in results:
+        print(result.data)
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
 """
 The first known use of "hello, world" was in a 1974 textbook about the C programming language.
 """
\ No newline at end of file
@@ -1,15 +1,47 @@
+import hashlib
 import os
-import requests
+import tempfile
+import httpx
+from io import BytesIO
 from typing import Tuple, Optional
+from urllib.parse import quote
 
+from PIL import Image
 
-def get_static_map(latitude: float, longitude: float, zoom: int = 13, 
+from agent_test.cache import CACHE_DIR
+from agent_test.concurrency import loop_local
+
+MAP_CACHE_DIR = CACHE_DIR / "maps"
+
+# Static Maps request URL; only the string fields need quoting when filled in
+_URL_TMPL = (
+    "https://maps.googleapis.com/maps/api/staticmap"
+    "?center={lat},{lon}&zoom={zoom}&size={w}x{h}"
+    "&markers=color:{color}%7C{lat},{lon}&maptype={maptype}&key={key}"
+)
+
+
+@loop_local
+def _get_client() -> httpx.AsyncClient:
+    """
+    Get the client for the running event loop.
+
+    Shared so repeated map fetches reuse pooled (HTTP/2) connections.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=10.0,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    )
+
+
+async def get_static_map(latitude: float, longitude: float, zoom: int = 13,
                   size: Tuple[int, int] = (600, 400),
                   marker_color: str = "red",
                   maptype: str = "satellite") -> Optional[bytes]:
     """
     Fetches a static map image from Google Maps API.
-    
+
     :param latitude: Latitude coordinate
     :param longitude: Longitude coordinate
     :param zoom: Zoom level (1-20)
@@ -21,23 +53,47 @@ def get_static_map(latitude: float, longitude: float, zoom: int = 13,
     api_key = os.getenv("GOOGLE_MAPS_API_KEY")
     if not api_key:
         raise ValueError("GOOGLE_MAPS_API_KEY environment variable not set")
-    
-    base_url = "https://maps.googleapis.com/maps/api/staticmap"
-    
-    params = {
-        "center": f"{latitude},{longitude}",
-        "zoom": zoom,
-        "size": f"{size[0]}x{size[1]}",
-        "markers": f"color:{marker_color}|{latitude},{longitude}",
-        "maptype": maptype,
-        "key": api_key
-    }
-    print(f"Fetching map with params: {params}")
-    
+
+    key = hashlib.sha1(
+        f"{latitude:.6f}_{longitude:.6f}_{zoom}_{size[0]}x{size[1]}_{maptype}_{marker_color}".encode()
+    ).hexdigest()
+    cache_path = MAP_CACHE_DIR / f"{key}.png"
+    if cache_path.exists():
+        return cache_path.read_bytes()
+
+    url = _URL_TMPL.format(
+        lat=latitude, lon=longitude, zoom=zoom, w=size[0], h=size[1],
+        color=quote(marker_color), maptype=quote(maptype), key=quote(api_key),
+    )
+    print(f"Fetching map for center={latitude},{longitude} zoom={zoom} maptype={maptype}")
+
     try:
-        response = requests.get(base_url, params=params)
+        response = await _get_client().get(url)
         response.raise_for_status()
-        return response.content
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error fetching map: {e}")
-        return None
\ No newline at end of file
+        return None
+
+    # write to a temp file and rename, so concurrent readers never see a partial image
+    MAP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=MAP_CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(response.content)
+    os.replace(tmp_path, cache_path)
+    return response.content
+
+
+def downscale_map(img_bytes: bytes, max_side: int = 512, quality: int = 75) -> bytes:
+    """
+    Shrink a map image and re-encode it as JPEG, to cut vision model tokens.
+
+    :param img_bytes: Raw image bytes (e.g. PNG from get_static_map)
+    :param max_side: Maximum width or height of the result in pixels
+    :param quality: JPEG quality (1-95)
+    :return: JPEG image bytes
+    """
+    img = Image.open(BytesIO(img_bytes)).convert("RGB")
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    buf = BytesIO()
+    img.save(buf, "JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
@@ -1,10 +1,12 @@
+import asyncio
 import os
 import logging
 from pydantic_ai import Agent
-from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
 from soilgrids import SoilGrids
 
+from agent_test.concurrency import BoundedOpenAIModel
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,7 +19,7 @@ if not api_key:
     raise ValueError("CBORG_API_KEY environment variable is not set.")
 
 # Configure the AI model with CBORG API endpoint
-ai_model = OpenAIModel(
+ai_model = BoundedOpenAIModel(
     model_name="anthropic/claude-sonnet",
     provider=OpenAIProvider(
         base_url="https://api.cborg.lbl.gov",
@@ -35,7 +37,7 @@ soil_grids = SoilGrids()
 
 # Register a tool to fetch soil pH data and metadata
 @soil_agent.tool_plain
-def get_soil_ph_image(
+async def get_soil_ph_image(
     west: float, south: float, east: float, north: float
 ) -> str:
     """
@@ -50,7 +52,9 @@ def get_soil_ph_image(
     try:
         # Fetch pH data as GeoTIFF
         tif_file = "soil_ph_map.tif"
-        data = soil_grids.get_coverage_data(
+        # Blocking download + GeoTIFF write, so keep it off the event loop
+        data = await asyncio.to_thread(
+            soil_grids.get_coverage_data,
             service_id="phh2o",
             coverage_id="phh2o_0-5cm_mean",
             west=west,
@@ -73,6 +77,17 @@ def get_soil_ph_image(
         return "An error occurred while fetching soil pH data."
 
 # Agent interprets and calls the tool automatically
-query = "Show me a soil pH map for the region west=-1784000, south=1356000, east=-1140000, north=1863000"
-result = soil_agent.run_sync(query)
-#print(result)
\ No newline at end of file
+DEMO_QUERIES = [
+    "Show me a soil pH map for the region west=-1784000, south=1356000, east=-1140000, north=1863000",
+]
+
+
+async def main():
+    results = await asyncio.gather(*[soil_agent.run(q) for q in DEMO_QUERIES])
+    #for result in results:
+    #    print(result)
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
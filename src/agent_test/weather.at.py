@@ -1,12 +1,19 @@
+import asyncio
+import functools
 import os
+from datetime import date, timedelta
+from geopy.extra.rate_limiter import RateLimiter
 from geopy.geocoders import Nominatim
+from joblib import Memory
 from meteostat import Point, Daily
-from pydantic_ai import Agent
+from pydantic_ai import Agent, ModelRetry
 from dateutil import parser
-from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
 from typing import Any
 
+from agent_test.cache import CACHE_DIR
+from agent_test.concurrency import BoundedOpenAIModel
+
 # Load CBORG API key from environment variable
 api_key = os.getenv("CBORG_API_KEY")
 
@@ -14,10 +21,23 @@ api_key = os.getenv("CBORG_API_KEY")
 if not api_key:
     raise ValueError("CBORG_API_KEY environment variable is not set.")
 
-geo = Nominatim(user_agent="EGSB Hackathon AI Agent toy")
+# geopy>=2 keeps a persistent session in its default adapter
+geo = Nominatim(user_agent="EGSB Hackathon AI Agent toy", timeout=10)
+# Nominatim's usage policy allows at most 1 request per second;
+# let errors propagate once retries are exhausted, rather than returning None
+geocode = RateLimiter(geo.geocode, min_delay_seconds=1, swallow_exceptions=False)
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_geocode(location_string: str):
+    # raise rather than return None, so a failed lookup is not cached
+    loc = geocode(location_string)
+    if loc is None:
+        raise ModelRetry(f"Could not find a location matching {location_string!r}")
+    return loc
 
 # Configure the AI model with CBORG API endpoint
-ai_model = OpenAIModel(
+ai_model = BoundedOpenAIModel(
     model_name="anthropic/claude-sonnet",
     provider=OpenAIProvider(
         base_url="https://api.cborg.lbl.gov",
@@ -41,13 +61,23 @@ def get_loc(location_string) -> (float, float):
 
     Returns a tuple of the latitude and longitude of the location.
     """
-    loc = geo.geocode(location_string)
+    loc = _cached_geocode(location_string.strip().lower())
     print(loc)
     print()
     return loc.latitude, loc.longitude
 
+memory = Memory(CACHE_DIR / "weather", verbose=0)
+
+
+def _fetch_daily(lat, lon, start, end):
+    return Daily(Point(lat, lon), start, end).fetch()
+
+# Only periods that ended a while ago are cached: recent days may still be partial or missing
+_fetch_daily_cached = memory.cache(_fetch_daily)
+WEATHER_CACHE_MIN_AGE = timedelta(days=7)
+
 @geo_agent.tool_plain
-def get_weather(location_string: str, start_date: str, end_date: str) -> dict[str, Any]:
+async def get_weather(location_string: str, start_date: str, end_date: str) -> dict[str, Any]:
     """
     Get information about the weather at a particular location over a particular time period.
     location_string - the location to query like an address a city / state / country etc.
@@ -55,21 +85,33 @@ def get_weather(location_string: str, start_date: str, end_date: str) -> dict[st
     end_date - the end of the period of interest as a string.
     Returns a dictionary of weather information for the location.
     """
-    pt = Point(*get_loc(location_string))
+    lat, lon = await asyncio.to_thread(get_loc, location_string)
     st = parser.parse(start_date)
     end = parser.parse(end_date)
-    print(pt, start_date, st, end_date, end)
-    ret = Daily(pt, st, end).fetch()
+    print(lat, lon, start_date, st, end_date, end)
+    # Meteostat data for a past period is deterministic per location, so cache on rounded coordinates
+    fetch = _fetch_daily_cached if end.date() <= date.today() - WEATHER_CACHE_MIN_AGE else _fetch_daily
+    ret = await asyncio.to_thread(fetch, round(lat, 3), round(lon, 3), st, end)
     print(ret)
-    d = ret.to_dict()
+    d = ret.reset_index().to_dict(orient="list")
     print(d)
     return d
 
-# Use the agent to query elevation
-result = geo_agent.run_sync(
+# Use the agent to query the weather
+DEMO_QUERIES = [
     """
     Tell me about the weather in the city of kalamazoo? over 7 days from February 14 ,2024.
     Summarize the general trends and how happy you think people would be about the weather.
-    """
-)
-print(result)
+    """,
+]
+
+
+async def main():
+    results = await asyncio.gather(*[geo_agent.run(q) for q in DEMO_QUERIES])
+    for result in results:
+        print(result)
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,6 +6,7 @@ from typing import List, Any
 
 import httpx
 import dotenv
+import orjson
 
 # Try importing gradio and error out if not installed.
 try:
@@ -17,10 +18,12 @@ except ImportError as e:
 
 # Import pydantic_ai modules for the agent and streaming responses.
 from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic_ai.messages import ToolCallPart, ToolReturnPart
 
+from agent_test.cache import get_cache
+from agent_test.concurrency import BoundedOpenAIModel, loop_local
+
 # Load environment variables from a .env file (ensure CBORG_API_KEY is set)
 dotenv.load_dotenv()
 api_key = os.getenv("CBORG_API_KEY")
@@ -28,6 +31,18 @@ if not api_key:
     raise ValueError("CBORG_API_KEY environment variable is not set.")
 
 
+# Async HTTP client shared by all Wikipedia calls on the running event loop,
+# with a bounded (HTTP/2) connection pool. It lives as long as its loop (for the
+# gradio app, the whole process), so it is deliberately never closed.
+@loop_local
+def _get_wiki_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        timeout=15,
+    )
+
+
 # Define a dependencies container for dependency injection.
 @dataclass
 class ApiDeps:
@@ -35,7 +50,7 @@ class ApiDeps:
 
 
 # Configure the AI model using your CBORG API endpoint.
-ai_model = OpenAIModel(
+ai_model = BoundedOpenAIModel(
     model_name="openai/gpt-4o",
     provider=OpenAIProvider(
         base_url="https://api.cborg.lbl.gov/v1",
@@ -55,64 +70,85 @@ wikipedia_api_agent = Agent(
 )
 
 
-# Register a tool to get animal information from Wikipedia.
-@wikipedia_api_agent.tool()
-async def get_animal_info(ctx: RunContext[ApiDeps], animal_name: str) -> str:
-    """
-    Get information about an animal using the Wikipedia API.
+# Two-tier cache of summaries keyed on normalized animal name: process-lifetime dict, then disk.
+_wiki_mem: dict[str, str] = {}
+_wiki_disk = get_cache("wiki")
+WIKI_CACHE_EXPIRE = 7 * 86400
 
-    This function searches for the specified animal on Wikipedia and returns a summary
-    of the information found.
-    """
-    try:
-        # Search for the animal's page.
-        search_params = {
-            "action": "query",
-            "list": "search",
-            "srsearch": f"{animal_name} animal",
-            "format": "json"
-        }
-        search_response = await ctx.deps.client.get("https://en.wikipedia.org/w/api.php", params=search_params)
-        search_response.raise_for_status()
-        search_data = search_response.json()
 
-        if not search_data["query"]["search"]:
-            return f"No information found for {animal_name}."
+async def _lookup_one(client: httpx.AsyncClient, animal_name: str) -> str:
+    """
+    Search Wikipedia for a single animal and return a summary of its page.
 
-        # Use the first result.
-        page_title = search_data["query"]["search"][0]["title"]
+    Successful lookups are cached; misses and errors are always retried.
+    """
+    key = animal_name.strip().lower()
+    if key in _wiki_mem:
+        return _wiki_mem[key]
+    cached = _wiki_disk.get(key)
+    if cached is not None:
+        _wiki_mem[key] = cached
+        return cached
 
-        # Retrieve the introductory extract for the page.
-        content_params = {
+    try:
+        # Search for the animal's page and retrieve its introductory extract in one request.
+        params = {
             "action": "query",
+            "generator": "search",
+            "gsrsearch": f"{animal_name} animal",
+            "gsrlimit": 1,
             "prop": "extracts",
             "exintro": True,
             "explaintext": True,
-            "titles": page_title,
-            "format": "json"
+            "format": "json",
+            "formatversion": 2
         }
-        content_response = await ctx.deps.client.get("https://en.wikipedia.org/w/api.php", params=content_params)
-        content_response.raise_for_status()
-        content_data = content_response.json()
+        response = await client.get("https://en.wikipedia.org/w/api.php", params=params)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+
+        # With a search generator, "query" is omitted entirely when nothing matches.
+        pages = data.get("query", {}).get("pages", [])
+        if not pages:
+            return f"No information found for {animal_name}."
 
-        pages = content_data["query"]["pages"]
-        page_id = next(iter(pages))
-        extract = pages[page_id].get("extract", "")
+        # Use the first result.
+        page = pages[0]
+        page_title = page["title"]
+        extract = page.get("extract", "")
 
         if not extract:
             return f"Found page {page_title} but couldn't extract any information."
 
         # Return a concise version.
-        return f"Information about {page_title} from Wikipedia:\n\n{extract[:800]}..."
+        result = f"Information about {page_title} from Wikipedia:\n\n{extract[:800]}..."
+        _wiki_mem[key] = result
+        _wiki_disk.set(key, result, expire=WIKI_CACHE_EXPIRE)
+        return result
     except Exception as e:
         return f"Error retrieving information about {animal_name}: {str(e)}"
 
 
-# --- Gradio Integration Section ---
+# Register a tool to get animal information from Wikipedia.
+@wikipedia_api_agent.tool()
+async def get_animal_info(ctx: RunContext[ApiDeps], animal_names: list[str]) -> dict[str, str]:
+    """
+    Get information about one or more animals using the Wikipedia API.
+
+    Pass every animal you need in a single call as a list of names; they are looked up
+    in parallel. Returns a mapping from each animal name to a summary of the information found.
+    """
+    results = await asyncio.gather(
+        *[_lookup_one(ctx.deps.client, name) for name in animal_names],
+        return_exceptions=True,
+    )
+    return {
+        name: r if isinstance(r, str) else f"Error retrieving information about {name}: {r}"
+        for name, r in zip(animal_names, results)
+    }
 
-# Create an Async HTTP client and instantiate dependency container.
-client = httpx.AsyncClient()
-deps = ApiDeps(client=client)
+
+# --- Gradio Integration Section ---
 
 # Define a mapping for tool display names (if the agent calls any tool).
 TOOL_TO_DISPLAY_NAME = {
@@ -120,6 +156,25 @@ TOOL_TO_DISPLAY_NAME = {
 }
 
 
+def _format_other_args(args: Any) -> str:
+    """
+    Format tool call args of any type not in _ARG_FORMATTERS.
+    """
+    # Older pydantic_ai versions wrap args in ArgsJson / ArgsDict objects
+    if hasattr(args, "args_json"):
+        return args.args_json
+    if hasattr(args, "args_dict"):
+        return json.dumps(args.args_dict)
+    return str(args)
+
+
+# Map the type of a tool call's args to a function rendering them as a string.
+_ARG_FORMATTERS = {
+    str: lambda args: args,
+    dict: lambda args: orjson.dumps(args, option=orjson.OPT_NON_STR_KEYS).decode(),
+}
+
+
 async def stream_from_agent(prompt: str, chatbot: list[dict], past_messages: list):
     """
     Asynchronously stream responses from the Wikipedia agent.
@@ -130,19 +185,16 @@ async def stream_from_agent(prompt: str, chatbot: list[dict], past_messages: lis
     chatbot.append({"role": "user", "content": prompt})
     yield gr.Textbox(interactive=False, value=""), chatbot, gr.skip()
 
+    # Tool call messages by tool call id, so returns can be attached without scanning the chat.
+    id_index: dict[str, dict] = {}
+    deps = ApiDeps(client=_get_wiki_client())
+
     async with wikipedia_api_agent.run_stream(prompt, deps=deps, message_history=past_messages) as result:
         for message in result.new_messages():
             for call in message.parts:
                 if isinstance(call, ToolCallPart):
-                    # Check if call.args is a string or an object with attributes
-                    if isinstance(call.args, str):
-                        call_args = call.args
-                    elif hasattr(call.args, "args_json"):
-                        call_args = call.args.args_json
-                    elif hasattr(call.args, "args_dict"):
-                        call_args = json.dumps(call.args.args_dict)
-                    else:
-                        call_args = str(call.args)
+                    fmt = _ARG_FORMATTERS.get(type(call.args), _format_other_args)
+                    call_args = fmt(call.args)
 
                     metadata = {"title": f"🛠️ Using {TOOL_TO_DISPLAY_NAME.get(call.tool_name, call.tool_name)}"}
                     if call.tool_call_id is not None:
@@ -154,10 +206,12 @@ async def stream_from_agent(prompt: str, chatbot: list[dict], past_messages: lis
                         "metadata": metadata,
                     }
                     chatbot.append(gr_message)
+                    if "id" in metadata:
+                        id_index[metadata["id"]] = gr_message
                 if isinstance(call, ToolReturnPart):
-                    for gr_message in chatbot:
-                        if gr_message.get("metadata", {}).get("id", "") == call.tool_call_id:
-                            gr_message["content"] += f"\nOutput: {json.dumps(call.content)}"
+                    gr_message = id_index.get(call.tool_call_id)
+                    if gr_message is not None:
+                        gr_message["content"] += f"\nOutput: {orjson.dumps(call.content).decode()}"
             yield gr.skip(), chatbot, gr.skip()
 
         chatbot.append({"role": "assistant", "content": ""})